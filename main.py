@@ -104,7 +104,7 @@ sentiment_analysis_prompt_with_examples = few_shot_generator.generate_examples(
 )
 
 
-print(Fore.RED +"\nFormatted Prompt with Few-Shot Examples:")
+print(Fore.RED +"\nFew-Shot Template (examples are rendered by format):")
 print(sentiment_analysis_prompt_with_examples.template)
 
 final_prompt = sentiment_analysis_prompt_with_examples.format(text="I am so happy today, but I am tired!")
@@ -1,4 +1,5 @@
 from promptsy.prompt import Prompt
 from promptsy.prompt_manager import PromptManager
 from promptsy.prompt_enhancer import PromptEnhancer
-from promptsy.auto_few_shot_generator import FewShotPromptGenerator
\ No newline at end of file
+from promptsy.auto_few_shot_generator import FewShotPromptGenerator
+from promptsy.rate_limiter import RateLimitScheduler
\ No newline at end of file
@@ -1,7 +1,9 @@
 import os
 from openai import OpenAI
-from promptsy.prompt import Prompt
+from promptsy.prompt import EXAMPLES_FIELD, Prompt, example_to_dict, format_example
 from promptsy.prompt_manager import PromptManager
+from promptsy.rate_limiter import RateLimitScheduler, get_scheduler
+from promptsy.tokenizer import count_tokens
 from pydantic import BaseModel
 from typing import List,Optional
 
@@ -10,19 +12,32 @@ class Example(BaseModel):
     answer: str
 
 class FewShotPromptGenerator:
-    def __init__(self, api_key: Optional[str] = None, model_name: str = "gpt-4o-mini"):
+    EXAMPLES_PLACEHOLDER = "{" + EXAMPLES_FIELD + "}"
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str = "gpt-4o-mini", scheduler: Optional[RateLimitScheduler] = None, priority: int = 0):
+        """
+        Initializes the FewShotPromptGenerator with the API key and model name.
+
+        :param api_key: OpenAI API key. If None, tries to retrieve from the environment variable.
+        :param model_name: The name of the model to be used (default: "gpt-4o-mini").
+        :param scheduler: RateLimitScheduler used for LLM calls. If None, uses the process-wide scheduler.
+        :param priority: Scheduling priority of this generator's LLM calls; lower values run first (default: 0).
+        """
         if api_key is None:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key is None:
                 raise ValueError("OpenAI API key not provided and OPENAI_API_KEY environment variable not set.")
-        self.client = OpenAI(api_key=api_key)
+        # Retries are handled by the scheduler so all callers back off together
+        self.client = OpenAI(api_key=api_key, max_retries=0)
         self.model_name = model_name
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+        self.priority = priority
         self.prompt_manager = PromptManager()
         self.auto_few_shot_prompts_directory = 'auto_few_shot_prompts'
         os.makedirs(self.auto_few_shot_prompts_directory, exist_ok=True)
 
 
-    def generate_examples(self, prompt_initial: Prompt, num_examples: int = 5, expected_outputs: Optional[List[str]] = None, return_examples=False) -> str:
+    def generate_examples(self, prompt_initial: Prompt, num_examples: int = 5, expected_outputs: Optional[List[str]] = None, return_examples=False, max_tokens: Optional[int] = None) -> str:
         """
         Generates a formatted prompt with few-shot examples based on the initial prompt and expected outputs.
 
@@ -30,15 +45,33 @@ class FewShotPromptGenerator:
         :param num_examples: Number of examples to generate.
         :param expected_outputs: Optional list of expected outputs (e.g., ['positive', 'negative', 'neutral']). If not provided, the model will generate general responses.
         :param return_examples: Optional return examples
+        :param max_tokens: Optional token budget for the few-shot template and its examples. Examples that do not fit are left out, and no more examples are generated once one does not fit.
         :return: Formatted prompt with examples.
+        :raises ValueError: If max_tokens is set and the reformatted template alone exceeds it.
         """
         # Use the template from the Prompt object
         prompt_template = prompt_initial.template
-        examples = [self.generate_example(prompt_template, expected_outputs) for _ in range(num_examples)]
-        
-        formatted_prompt = self._format_few_shot_prompt(prompt_template, examples)
-       
-        prompt_initial.template = self.__call_llm_reformat_prompt(formatted_prompt)
+        few_shot_template = self._format_few_shot_prompt(prompt_template)
+
+        examples = []
+        total = count_tokens(few_shot_template.replace(self.EXAMPLES_PLACEHOLDER, ""))
+        for idx in range(1, num_examples + 1):
+            if max_tokens is not None and total >= max_tokens:
+                break
+            example = self.generate_example(prompt_template, expected_outputs)
+            if max_tokens is not None:
+                total += count_tokens(format_example(idx, example))
+                if total > max_tokens:
+                    break
+            examples.append(example)
+
+        # The examples stay out of the reformatted text so Prompt.format can render and trim them
+        prompt_initial.template = self._ensure_examples_field(self.__call_llm_reformat_prompt(few_shot_template))
+        prompt_initial.examples = [example_to_dict(example) for example in examples]
+        if max_tokens is not None:
+            # The reformatted template may be longer than the one that was budgeted
+            prompt_initial.trim_examples(max_tokens)
+            examples = examples[:len(prompt_initial.examples)]
 
         self.save_few_shot_prompt(prompt_initial)  # Save the original Prompt object
 
@@ -61,7 +94,9 @@ class FewShotPromptGenerator:
     
     def __call_llm_reformat_prompt(self, prompt: str):
         
-        response = self.client.chat.completions.create(
+        response = self.scheduler.chat_completion(
+            self.client.chat.completions.create,
+            priority=self.priority,
             model=self.model_name,
             messages=[{"role": "user", "content": f"""
                You are a prompt formatter specialist. Your task is to create a formatted prompt for a given task using the following structure (DO NOT CREATE NEW EXAMPLES):
@@ -69,6 +104,8 @@ class FewShotPromptGenerator:
                         1 - Prompt Instructions
                         2 - Examples
                         3 - User input included in curly braces variables to completitions
+
+                Keep the {self.EXAMPLES_PLACEHOLDER} placeholder and every other value enclosed in curly braces unchanged.
                         
 
                 # Now is your time to format the prompt
@@ -109,7 +146,9 @@ class FewShotPromptGenerator:
             )
             user_message = f"Generate a diverse and unbiased input-output example for the following prompt: {prompt}."
 
-        completion = self.client.beta.chat.completions.parse(
+        completion = self.scheduler.chat_completion(
+            self.client.beta.chat.completions.parse,
+            priority=self.priority,
             model=self.model_name,
             messages=[
                 {"role": "system", "content": system_message},
@@ -120,22 +159,25 @@ class FewShotPromptGenerator:
         
         return completion.choices[0].message.parsed.dict()
 
-    def _format_few_shot_prompt(self, prompt_initial: str, examples: List[Example]) -> str:
+    def _format_few_shot_prompt(self, prompt_initial: str) -> str:
         """
-        Formats the prompt with a list of examples for few-shot learning.
+        Formats the prompt for few-shot learning, with a placeholder where the examples are rendered.
 
         :param prompt_initial: The initial prompt for the LLM.
-        :param examples: List of Example objects.
-        :return: Formatted prompt with examples.
+        :return: Formatted prompt with an examples placeholder.
         """
-        formatted_examples = ""
-        for idx, example in enumerate(examples, start=1):
-            formatted_examples += (
-                f"## Example {idx}\n"
-                f"{example.question}\n"
-                f"{example.answer}\n\n"
-            )
-        return f"{prompt_initial}\n\n# Examples\n{formatted_examples}\n\n# Output\n"
+        return f"{prompt_initial}\n\n# Examples\n{self.EXAMPLES_PLACEHOLDER}\n\n# Output\n"
+
+    def _ensure_examples_field(self, template: str) -> str:
+        """
+        Makes sure the reformatted template still has the examples placeholder.
+
+        :param template: The template returned by the LLM.
+        :return: The template with an examples placeholder.
+        """
+        if self.EXAMPLES_PLACEHOLDER in template:
+            return template
+        return f"{template}\n\n# Examples\n{self.EXAMPLES_PLACEHOLDER}"
     
     def save_few_shot_prompt(self, prompt: Prompt):
         """
@@ -1,6 +1,49 @@
+import string
 import yaml
 
 from promptsy.prompt_manager import PromptManager
+from promptsy.template_compiler import TemplateCompiler
+from promptsy.tokenizer import count_tokens, get_tokenizer, truncate_to_tokens
+
+EXAMPLES_FIELD = 'examples'
+
+
+def format_example(index, example):
+    """
+    Render a few-shot example as a numbered prompt section.
+
+    Args:
+        index (int): The 1-based number of the example.
+        example: A string, a dictionary with 'question' and 'answer' keys, or an object with
+            question and answer attributes.
+
+    Returns:
+        str: The rendered example.
+    """
+    if isinstance(example, str):
+        return f"## Example {index}\n{example}\n\n"
+    if isinstance(example, dict):
+        question, answer = example['question'], example['answer']
+    else:
+        question, answer = example.question, example.answer
+    return f"## Example {index}\n{question}\n{answer}\n\n"
+
+
+def example_to_dict(example):
+    """
+    Convert a few-shot example to a plain value that can be saved to YAML.
+
+    Args:
+        example: A string, a dictionary with 'question' and 'answer' keys, or an object with
+            question and answer attributes.
+
+    Returns:
+        str or dict: The example as a string or a dictionary.
+    """
+    if isinstance(example, (str, dict)):
+        return example
+    return {'question': example.question, 'answer': example.answer}
+
 
 class Prompt:
     """
@@ -10,9 +53,12 @@ class Prompt:
         name (str): The name of the prompt.
         description (str): A brief description of the prompt.
         template (str): The template string for the prompt.
+        examples (list): Optional few-shot examples rendered into the ``{examples}`` field.
+        tokenizer (callable): Optional tokenizer used for token budgets. Defaults to the
+            tokenizer returned by promptsy.tokenizer.get_tokenizer.
     """
 
-    def __init__(self, name, description, template):
+    def __init__(self, name, description, template, examples=None, tokenizer=None, prompt_manager=None):
         """
         Initialize a new Prompt instance.
 
@@ -20,23 +66,236 @@ class Prompt:
             name (str): The name of the prompt.
             description (str): A brief description of the prompt.
             template (str): The template string for the prompt.
+            examples (list): Optional few-shot examples rendered into the ``{examples}`` field.
+            tokenizer (callable): Optional tokenizer used for token budgets.
+            prompt_manager (PromptManager): Optional store used to save the prompt and resolve
+                its includes. Defaults to a PromptManager on the default directory.
         """
         self.name = name
         self.description = description
         self.template = template
-        self.prompt_manager = PromptManager()
+        self.examples = [example_to_dict(example) for example in examples or []]
+        self.tokenizer = tokenizer
+        self.prompt_manager = prompt_manager if prompt_manager is not None else PromptManager()
+        self._parsed_template = None
+        self._compiled_template = None
+
+    def compile(self):
+        """
+        Resolve the include references in the template against the prompts in the PromptManager store.
+
+        The result is cached until the template changes or one of the included prompts is modified.
+
+        Returns:
+            str: The template with every ``{% include name %}`` replaced by the included prompt.
+        """
+        template = self.template
+        manager = self.prompt_manager
+        cached = self._compiled_template
+        if cached is not None and cached[0] == template and cached[1] is manager and manager.is_current(cached[2]):
+            return cached[3]
+        if not TemplateCompiler.has_includes(template):
+            return template
+
+        stamps = {}
+        compiled = manager.compile_template(template, self.name, stamps)
+        self._compiled_template = (template, manager, stamps, compiled)
+        return compiled
+
+    def _get_tokenizer(self):
+        return self.tokenizer or get_tokenizer()
+
+    def _parse_template(self):
+        """
+        Split the compiled template into literal text and fields, counting the literal tokens once.
+
+        The result is cached until the template or tokenizer changes.
+
+        Returns:
+            tuple: The list of (literal_text, field_name, format_spec, conversion) segments and
+            the token count of all literal text.
+        """
+        template = self.compile()
+        tokenizer = self._get_tokenizer()
+        cached = self._parsed_template
+        if cached is None or cached[0] != template or cached[1] is not tokenizer:
+            segments = list(string.Formatter().parse(template))
+            literal_tokens = sum(tokenizer(literal) for literal, _, _, _ in segments)
+            cached = self._parsed_template = (template, tokenizer, segments, literal_tokens)
+        return cached[2], cached[3]
+
+    def _example_token_counts(self):
+        tokenizer = self._get_tokenizer()
+        return [
+            count_tokens(format_example(index, example), tokenizer)
+            for index, example in enumerate(self.examples, start=1)
+        ]
+
+    def template_token_count(self):
+        """
+        Get the number of tokens in the template text, excluding the fields to be formatted.
+
+        Returns:
+            int: The cached token count of the template's literal text.
+        """
+        return self._parse_template()[1]
+
+    def token_count(self, **kwargs):
+        """
+        Estimate the number of tokens in the prompt formatted with the given keyword arguments.
+
+        The template and examples are counted once and cached; only the values are counted per call.
+
+        Args:
+            **kwargs: Keyword arguments to be used for formatting the template.
+
+        Returns:
+            int: The estimated token count.
+        """
+        _, _, value_tokens, literal_tokens, example_fields = self._measure(kwargs)
+        return literal_tokens + sum(value_tokens) + sum(self._example_token_counts()) * example_fields
+
+    def _render_fields(self, segments, kwargs):
+        """
+        Render each field of the template, leaving the examples field to be assembled later.
+
+        Returns:
+            list: The rendered value of each segment, or None where there is no value to render.
+        """
+        formatter = string.Formatter()
+        use_examples = bool(self.examples) and EXAMPLES_FIELD not in kwargs
+        values = []
+        for _, field_name, format_spec, conversion in segments:
+            if field_name is None or (use_examples and field_name == EXAMPLES_FIELD):
+                values.append(None)
+                continue
+            value, _ = formatter.get_field(field_name, (), kwargs)
+            value = formatter.convert_field(value, conversion)
+            if format_spec and '{' in format_spec:
+                # Expand nested fields such as {value:>{width}} the same way str.format does
+                format_spec = formatter.vformat(format_spec, (), kwargs)
+            values.append(formatter.format_field(value, format_spec))
+        return values
+
+    def _measure(self, kwargs):
+        """
+        Render the fields of the template and count the tokens of each rendered value.
+
+        Returns:
+            tuple: The segments, the rendered values, the token count of each value, the token
+            count of the literal text and the number of fields filled with the prompt's examples.
+        """
+        segments, literal_tokens = self._parse_template()
+        values = self._render_fields(segments, kwargs)
+        tokenizer = self._get_tokenizer()
+        value_tokens = [tokenizer(value) if value is not None else 0 for value in values]
+        example_fields = sum(1 for (_, field_name, _, _), value in zip(segments, values)
+                             if field_name is not None and value is None)
+        return segments, values, value_tokens, literal_tokens, example_fields
+
+    def _render_examples(self, count):
+        return ''.join(format_example(index, example) for index, example in enumerate(self.examples[:count], start=1))
 
     def format(self, **kwargs):
         """
         Format the prompt template with the provided keyword arguments.
 
+        Include references are resolved before formatting, and the prompt's examples fill the
+        ``{examples}`` field unless it is passed explicitly.
+
+        Args:
+            **kwargs: Keyword arguments to be used for formatting the template.
+
+        Returns:
+            str: The formatted prompt string.
+        """
+        if self.examples and EXAMPLES_FIELD not in kwargs:
+            kwargs[EXAMPLES_FIELD] = self._render_examples(len(self.examples))
+        return self.compile().format(**kwargs)
+
+    def format_with_budget(self, max_tokens, truncate=(), values=None, **kwargs):
+        """
+        Format the prompt template so that its estimated size fits within a token budget.
+
+        Examples are dropped from the end first, then the variables named in truncate are
+        shortened, in order, until the prompt fits. The template and examples are only tokenized
+        once; each call counts just the variable values. Without trimming, the result is the
+        same as format.
+
         Args:
+            max_tokens (int): The maximum number of tokens for the formatted prompt.
+            truncate (list): Names of the variables that may be truncated to fit max_tokens.
+            values (dict): Optional values for the template, for variables whose names clash
+                with the parameters of this method.
             **kwargs: Keyword arguments to be used for formatting the template.
 
         Returns:
             str: The formatted prompt string.
+
+        Raises:
+            ValueError: If the prompt cannot fit within max_tokens.
+        """
+        kwargs = dict(values or {}, **kwargs)
+        segments, rendered, value_tokens, literal_tokens, example_fields = self._measure(kwargs)
+        tokenizer = self._get_tokenizer()
+        example_tokens = self._example_token_counts()
+        kept_examples = len(example_tokens)
+
+        total = literal_tokens + sum(value_tokens) + sum(example_tokens) * example_fields
+        while total > max_tokens and example_fields and kept_examples:
+            kept_examples -= 1
+            total -= example_tokens[kept_examples] * example_fields
+
+        for variable in truncate:
+            if total <= max_tokens:
+                break
+            positions = [index for index, segment in enumerate(segments) if segment[1] == variable]
+            if not positions:
+                continue
+            excess = total - max_tokens
+            reduction = -(-excess // len(positions))
+            for index in positions:
+                budget = max(0, value_tokens[index] - reduction)
+                rendered[index] = truncate_to_tokens(rendered[index], budget, tokenizer)
+                total -= value_tokens[index]
+                value_tokens[index] = tokenizer(rendered[index])
+                total += value_tokens[index]
+
+        if total > max_tokens:
+            raise ValueError(
+                f"Prompt {self.name} needs about {total} tokens, which exceeds max_tokens={max_tokens}"
+            )
+
+        rendered_examples = self._render_examples(kept_examples)
+        return ''.join(
+            literal + (value if value is not None else (rendered_examples if field_name is not None else ''))
+            for (literal, field_name, _, _), value in zip(segments, rendered)
+        )
+
+    def trim_examples(self, max_tokens):
+        """
+        Drop examples from the end until the template and examples fit within a token budget.
+
+        Variable values are not counted, since they are only known when formatting.
+
+        Args:
+            max_tokens (int): The maximum number of tokens for the template and its examples.
+
+        Raises:
+            ValueError: If the template alone exceeds max_tokens.
         """
-        return self.template.format(**kwargs)
+        segments, literal_tokens = self._parse_template()
+        example_fields = sum(1 for _, field_name, _, _ in segments if field_name == EXAMPLES_FIELD)
+        if literal_tokens > max_tokens:
+            raise ValueError(
+                f"Prompt {self.name} template needs about {literal_tokens} tokens, which exceeds max_tokens={max_tokens}"
+            )
+        total = literal_tokens
+        for index, tokens in enumerate(self._example_token_counts()):
+            total += tokens * example_fields
+            if total > max_tokens:
+                self.examples = self.examples[:index]
+                break
 
     def __str__(self):
         """
@@ -54,19 +313,23 @@ class Prompt:
         Returns:
             dict: A dictionary representation of the Prompt instance.
         """
-        return {
+        data = {
             'name': self.name,
             'description': self.description,
             'template': self.template
         }
+        if self.examples:
+            data['examples'] = self.examples
+        return data
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, prompt_manager=None):
         """
         Create a Prompt instance from a dictionary.
 
         Args:
             data (dict): A dictionary containing the prompt data.
+            prompt_manager (PromptManager): Optional store the prompt belongs to.
 
         Returns:
             Prompt: A new Prompt instance created from the dictionary.
@@ -74,7 +337,10 @@ class Prompt:
         # Ensure data is a dictionary
         if not isinstance(data, dict):
             raise ValueError("Expected a dictionary for data")
-        return cls(data['name'], data['description'], data['template'])
+        return cls(
+            data['name'], data['description'], data['template'],
+            examples=data.get('examples'), prompt_manager=prompt_manager
+        )
 
     def save(self):
         """
@@ -86,20 +352,21 @@ class Prompt:
         self.prompt_manager.save(self.to_dict(), self.name)
 
     @classmethod
-    def load(cls, name):
+    def load(cls, name, version=None):
         """
         Load a Prompt instance using the provided PromptManager and prompt name.
 
         Args:
             manager (PromptManager): The PromptManager instance to use for loading the prompt.
             name (str): The name of the prompt to load.
+            version (int or str): Optional version number or digest of a previously saved version.
 
         Returns:
             Prompt: The loaded Prompt instance.
         """
         from promptsy.prompt_manager import PromptManager
         prompt_manager = PromptManager()
-        data = prompt_manager.load(name)  # Check what this returns
+        data = prompt_manager.load(name, version=version)  # Check what this returns
        
         return data
     
@@ -2,22 +2,28 @@ import os
 from openai import OpenAI
 from promptsy.prompt import Prompt
 from promptsy.prompt_manager import PromptManager
+from promptsy.rate_limiter import get_scheduler
 
 class PromptEnhancer:
-    def __init__(self, api_key=None, model_name="gpt-4o-mini"):
+    def __init__(self, api_key=None, model_name="gpt-4o-mini", scheduler=None, priority=0):
         """
         Initializes the PromptEnhancer with the API key and model name.
 
         :param api_key: OpenAI API key. If None, tries to retrieve from the environment variable.
         :param model_name: The name of the model to be used (default: "gpt-4o-mini").
+        :param scheduler: RateLimitScheduler used for LLM calls. If None, uses the process-wide scheduler.
+        :param priority: Scheduling priority of this enhancer's LLM calls; lower values run first (default: 0).
         """
         if api_key is None:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key is None:
                 raise ValueError("OpenAI API key not provided and OPENAI_API_KEY environment variable not set.")
         
-        self.client = OpenAI(api_key=api_key)
+        # Retries are handled by the scheduler so all callers back off together
+        self.client = OpenAI(api_key=api_key, max_retries=0)
         self.model_name = model_name
+        self.scheduler = scheduler if scheduler is not None else get_scheduler()
+        self.priority = priority
         self.prompt_manager = PromptManager()
         self.enhanced_prompts_directory = 'enhanced_prompts'
         os.makedirs(self.enhanced_prompts_directory, exist_ok=True)
@@ -60,7 +66,9 @@ class PromptEnhancer:
         :param prompt: The prompt to be sent to the LLM.
         :return: The response generated by the LLM.
         """
-        response = self.client.chat.completions.create(
+        response = self.scheduler.chat_completion(
+            self.client.chat.completions.create,
+            priority=self.priority,
             model=self.model_name,
             messages=[{"role": "user", "content": prompt}],
             stream=False,
@@ -1,11 +1,20 @@
+import hashlib
 import os
+import re
+import tempfile
 import yaml
 import pkg_resources
 from colorama import init, Fore, Style
+from promptsy.template_compiler import TemplateCompiler
 
 
 init()  # Initialize colorama
 
+VERSIONS_DIRECTORY = '.versions'
+# Each version log entry is a sha256 hex digest plus a newline, so entries can be read by offset
+VERSION_ENTRY_SIZE = 65
+DIGEST_PATTERN = re.compile(r'[0-9a-f]{64}')
+
 class PromptManager:
     """
     A class for managing prompts stored in YAML files.
@@ -23,6 +32,7 @@ class PromptManager:
         """
         self.base_directory = base_directory
         os.makedirs(base_directory, exist_ok=True)
+        self.template_compiler = TemplateCompiler.for_directory(base_directory)
 
     
     def _get_file_path(self, name):
@@ -45,49 +55,365 @@ class PromptManager:
         
         return os.path.join(directory_path, file_name)
 
+    def _get_version_log_path(self, file_path):
+        """
+        Get the path of the version log for a prompt file.
+
+        Args:
+            file_path (str): The file path of the prompt.
+
+        Returns:
+            str: The path of the version log.
+        """
+        relative_path = os.path.relpath(file_path, self.base_directory)
+        return os.path.join(self.base_directory, VERSIONS_DIRECTORY, 'logs', os.path.splitext(relative_path)[0] + '.log')
+
+    def _get_blob_path(self, digest):
+        """
+        Get the path of the content-addressed blob for a digest.
+
+        Args:
+            digest (str): The sha256 hex digest of the serialized prompt.
+
+        Returns:
+            str: The path of the blob.
+        """
+        return os.path.join(self.base_directory, VERSIONS_DIRECTORY, 'objects', digest[:2], digest)
+
+    def _store_version(self, file_path, content, digest):
+        """
+        Store a serialized prompt in the blob store and append it to the prompt's version log.
+
+        Identical content is stored only once, no matter how many prompts or versions share it.
+
+        Args:
+            file_path (str): The file path of the prompt.
+            content (str): The serialized prompt.
+            digest (str): The sha256 hex digest of the content.
+        """
+        blob_path = self._get_blob_path(digest)
+        if not os.path.exists(blob_path):
+            blob_directory = os.path.dirname(blob_path)
+            os.makedirs(blob_directory, exist_ok=True)
+            # A unique temporary file per writer, so concurrent saves never share one
+            with tempfile.NamedTemporaryFile(dir=blob_directory, prefix=digest, suffix='.tmp', delete=False) as file:
+                file.write(content.encode('utf-8'))
+            os.replace(file.name, blob_path)
+
+        log_path = self._get_version_log_path(file_path)
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        # Binary mode keeps every entry exactly VERSION_ENTRY_SIZE bytes on all platforms
+        with open(log_path, 'ab') as file:
+            size = file.seek(0, os.SEEK_END)
+            if size % VERSION_ENTRY_SIZE:
+                # Drop the partial entry left by an interrupted write so later entries stay aligned
+                file.truncate(size - size % VERSION_ENTRY_SIZE)
+            file.write(digest.encode('ascii') + b'\n')
+
+    def _read_version_entry(self, log_path, index):
+        """
+        Read a single entry of a version log by its offset.
+
+        Args:
+            log_path (str): The path of the version log.
+            index (int): The 0-based index of the entry.
+
+        Returns:
+            str: The digest stored in the entry.
+
+        Raises:
+            ValueError: If the entry is not a valid digest.
+        """
+        with open(log_path, 'rb') as file:
+            file.seek(index * VERSION_ENTRY_SIZE)
+            return self._parse_version_entry(log_path, index, file.read(VERSION_ENTRY_SIZE))
+
+    def _parse_version_entry(self, log_path, index, entry):
+        """
+        Validate a raw version log entry and extract its digest.
+
+        Args:
+            log_path (str): The path of the version log.
+            index (int): The 0-based index of the entry.
+            entry (bytes): The raw entry.
+
+        Returns:
+            str: The digest stored in the entry.
+
+        Raises:
+            ValueError: If the entry is not a valid digest followed by a newline.
+        """
+        digest = entry[:-1].decode('ascii', errors='replace')
+        if len(entry) != VERSION_ENTRY_SIZE or entry[-1:] != b'\n' or not DIGEST_PATTERN.fullmatch(digest):
+            error_message = f"Version log {log_path} has a corrupt entry at version {index + 1}."
+            print(Fore.RED + error_message + Style.RESET_ALL)
+            raise ValueError(error_message)
+        return digest
+
+    def _get_latest_version_digest(self, file_path):
+        """
+        Get the digest of the latest recorded version of a prompt.
+
+        Args:
+            file_path (str): The file path of the prompt.
+
+        Returns:
+            str: The digest, or None if no version has been recorded.
+        """
+        log_path = self._get_version_log_path(file_path)
+        # A trailing partial entry from an interrupted write is not a recorded version
+        count = self._count_version_entries(log_path)
+        if count == 0:
+            return None
+        return self._read_version_entry(log_path, count - 1)
+
+    def _count_version_entries(self, log_path):
+        """
+        Count the complete entries of a version log.
+
+        Args:
+            log_path (str): The path of the version log.
+
+        Returns:
+            int: The number of complete entries, or 0 if the log does not exist.
+        """
+        if not os.path.exists(log_path):
+            return 0
+        return os.path.getsize(log_path) // VERSION_ENTRY_SIZE
+
     def save(self, prompt, name):
         """
         Save a prompt to a YAML file.
 
+        The write is skipped when the stored file already has the same content. Every distinct
+        version is kept in a content-addressed blob store and recorded in the prompt's version log.
+
         Args:
-            prompt (dict): The prompt data to be saved.
+            prompt (dict): The prompt data to be saved. Prompt objects are converted with to_dict.
             name (str): The name of the prompt.
+
+        Returns:
+            str: The sha256 hex digest identifying the saved version.
         """
+        if hasattr(prompt, 'to_dict'):
+            prompt = prompt.to_dict()
+        content = yaml.dump({'text': prompt})
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
         file_path = self._get_file_path(name)
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        with open(file_path, 'w') as file:
-            yaml.dump({'text': prompt}, file)
+
+        if self._get_latest_version_digest(file_path) != digest:
+            self._store_version(file_path, content, digest)
+
+        if os.path.exists(file_path):
+            with open(file_path, 'rb') as file:
+                if hashlib.sha256(file.read()).hexdigest() == digest:
+                    print(Fore.YELLOW + f"Prompt {file_path} is unchanged, skipping write" + Style.RESET_ALL)
+                    return digest
+
+        with open(file_path, 'wb') as file:
+            file.write(content.encode('utf-8'))
+        # Only the prompts that include this one need to be recompiled
+        self.template_compiler.invalidate(file_path)
         # Print the success message in green
         print(Fore.GREEN + f"Prompt saved to {file_path}" + Style.RESET_ALL)
+        return digest
 
-    
-    def load(self, name):
+    def list_versions(self, name):
         """
-        Load a prompt from a YAML file.
+        List the recorded versions of a prompt, oldest first.
 
         Args:
             name (str): The name of the prompt.
 
         Returns:
-            dict: The loaded prompt data.
+            list: The sha256 hex digests of each version; version N is at index N - 1.
+
+        Raises:
+            ValueError: If the version log has a corrupt entry.
+        """
+        log_path = self._get_version_log_path(self._get_file_path(name))
+        if not os.path.exists(log_path):
+            return []
+        with open(log_path, 'rb') as file:
+            data = file.read()
+        # Ignore a trailing partial entry left by an interrupted write
+        return [
+            self._parse_version_entry(log_path, index, data[offset:offset + VERSION_ENTRY_SIZE])
+            for index, offset in enumerate(range(0, len(data) - VERSION_ENTRY_SIZE + 1, VERSION_ENTRY_SIZE))
+        ]
+
+    def _get_version_digest(self, name, version):
+        """
+        Get the digest of a specific version of a prompt.
+
+        Args:
+            name (str): The name of the prompt.
+            version (int or str): The 1-based version number (negative numbers count from the
+                latest version), as an int or a numeric string, or a digest from this prompt's
+                version log.
+
+        Returns:
+            str: The digest of the requested version.
+
+        Raises:
+            FileNotFoundError: If the version does not exist for this prompt.
+            ValueError: If the version log has a corrupt entry.
+        """
+        error_message = f"Version {version} of prompt {name} does not exist."
+        if isinstance(version, str) and DIGEST_PATTERN.fullmatch(version):
+            # Only digests recorded for this prompt are accepted, never another prompt's blob
+            if version in self.list_versions(name):
+                return version
+            print(Fore.RED + error_message + Style.RESET_ALL)
+            raise FileNotFoundError(error_message)
+
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            print(Fore.RED + error_message + Style.RESET_ALL)
+            raise FileNotFoundError(error_message)
+
+        log_path = self._get_version_log_path(self._get_file_path(name))
+        count = self._count_version_entries(log_path)
+        index = version - 1 if version > 0 else count + version
+        if version == 0 or not 0 <= index < count:
+            print(Fore.RED + error_message + Style.RESET_ALL)
+            raise FileNotFoundError(error_message)
+
+        return self._read_version_entry(log_path, index)
+
+    def _read_file(self, file_path):
+        """
+        Read the YAML data stored in a prompt file.
+
+        Args:
+            file_path (str): The path of the prompt file.
+
+        Returns:
+            dict: The parsed YAML data.
 
         Raises:
             FileNotFoundError: If the prompt file does not exist.
         """
-        from promptsy.prompt import Prompt
-        file_path = self._get_file_path(name)
-        
         if not os.path.exists(file_path):
             error_message = f"Prompt file {file_path} does not exist."
             print(Fore.RED + error_message + Style.RESET_ALL)
             raise FileNotFoundError(error_message)
         
         with open(file_path, 'r') as file:
-            data = yaml.safe_load(file)
+            return yaml.safe_load(file)
+
+    def _read_template(self, file_path):
+        """
+        Read the raw template stored in a prompt file.
+
+        Args:
+            file_path (str): The path of the prompt file.
+
+        Returns:
+            str: The template string, with include references left unresolved.
+        """
+        return self._read_file(file_path)['text']['template']
+
+    def _get_file_stamp(self, file_path):
+        """
+        Get a value that changes whenever a prompt file is rewritten.
+
+        Args:
+            file_path (str): The path of the prompt file.
+
+        Returns:
+            tuple: The modification time and size of the file, or None if it does not exist.
+        """
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self, name, version=None):
+        """
+        Load a prompt from a YAML file.
+
+        Args:
+            name (str): The name of the prompt.
+            version (int or str): Optional version to load instead of the current file, either
+                a 1-based version number (negative numbers count from the latest version) or a
+                digest returned by save for this prompt.
+
+        Returns:
+            dict: The loaded prompt data.
+
+        Raises:
+            FileNotFoundError: If the prompt file or the requested version does not exist.
+        """
+        from promptsy.prompt import Prompt
+        if version is None:
+            file_path = self._get_file_path(name)
+        else:
+            file_path = self._get_blob_path(self._get_version_digest(name, version))
+        data = self._read_file(file_path)
         
         # Cria e retorna um objeto Prompt com os dados carregados
-        return Prompt.from_dict(data['text'])  # Usando o método from_dict da classe Prompt
+        return Prompt.from_dict(data['text'], prompt_manager=self)  # Usando o método from_dict da classe Prompt
+
+    def compile(self, name):
+        """
+        Get the template of a stored prompt with every include reference resolved.
+
+        Compiled templates are cached and only recompiled after the prompt, or a prompt it
+        includes, is saved again or its file is modified.
+
+        Args:
+            name (str): The name of the prompt.
+
+        Returns:
+            str: The compiled template.
+
+        Raises:
+            FileNotFoundError: If the prompt or one of its includes does not exist.
+            TemplateCycleError: If the prompts include each other in a cycle.
+        """
+        return self.template_compiler.compile_stored(
+            self._get_file_path(name), self._get_file_path, self._read_template, self._get_file_stamp
+        )
+
+    def compile_template(self, template, name=None, stamps=None):
+        """
+        Resolve the include references of a template against the prompts in this store.
+
+        Args:
+            template (str): The template to compile.
+            name (str): The name the template is stored under, if any. Used to detect a
+                prompt that includes itself.
+            stamps (dict): Optional dictionary filled with the stamp of every prompt the
+                template includes, directly or indirectly. See is_current.
+
+        Returns:
+            str: The compiled template.
+
+        Raises:
+            FileNotFoundError: If one of the included prompts does not exist.
+            TemplateCycleError: If the prompts include each other in a cycle.
+        """
+        key = self._get_file_path(name) if name is not None else None
+        return self.template_compiler.compile(
+            template, self._get_file_path, self._read_template, key, self._get_file_stamp, stamps
+        )
+
+    def is_current(self, stamps):
+        """
+        Check whether the prompts recorded by compile_template are unchanged.
+
+        Args:
+            stamps (dict): The stamps filled in by compile_template.
+
+        Returns:
+            bool: True if none of the included prompts was modified since.
+        """
+        return all(self._get_file_stamp(key) == stamp for key, stamp in stamps.items())
 
     def load_from_package(self, name):
         """
@@ -108,7 +434,7 @@ class PromptManager:
             file_path = pkg_resources.resource_filename(package_or_requirement="promptsy", resource_name=os.path.join('prompts', f"{name}.yaml"))
             with open(file_path, 'r') as file:
                 data = yaml.safe_load(file)
-            return Prompt.from_dict(data['text'])
+            return Prompt.from_dict(data['text'], prompt_manager=self)
         except FileNotFoundError:
             error_message = f"Prompt file {name}.yaml does not exist in the package."
             print(error_message)
@@ -0,0 +1,291 @@
+import email.utils
+import functools
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import openai
+
+from promptsy.tokenizer import get_tokenizer
+
+
+# Matches the statuses the OpenAI SDK retries itself, since the scheduler takes over its retries
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+
+def estimate_message_tokens(messages):
+    """
+    Estimate the number of tokens used by a list of chat messages.
+
+    Args:
+        messages (list): A list of dictionaries with a 'content' key.
+
+    Returns:
+        int: The estimated token count, including a small per-message overhead.
+    """
+    tokenizer = get_tokenizer()
+    return sum(tokenizer(message.get('content') or '') + 4 for message in messages)
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at a fixed rate per minute.
+
+    Args:
+        rate_per_minute (float): The number of units restored every minute.
+        capacity (float): The maximum number of units the bucket can hold. Defaults to rate_per_minute.
+        clock (callable): A monotonic clock returning seconds. Defaults to time.monotonic.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        """
+        Initialize a full TokenBucket.
+
+        Args:
+            rate_per_minute (float): The number of units restored every minute.
+            capacity (float): The maximum number of units the bucket can hold. Defaults to rate_per_minute.
+            clock (callable): A monotonic clock returning seconds. Defaults to time.monotonic.
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be greater than zero")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.clock = clock
+        self.available = self.capacity
+        self._last_refill = clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self.available = min(self.capacity, self.available + elapsed * self.rate)
+            self._last_refill = now
+
+    def time_until_available(self, amount):
+        """
+        Get how long to wait before the given amount can be consumed.
+
+        Requests larger than the capacity are clamped to the capacity so they can still proceed.
+
+        Args:
+            amount (float): The number of units required.
+
+        Returns:
+            float: The number of seconds to wait (0 if the amount is available now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount):
+        """
+        Remove the given amount from the bucket.
+
+        Args:
+            amount (float): The number of units to consume.
+        """
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+
+def _get_status_code(exc):
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None:
+        response = getattr(exc, 'response', None)
+        status_code = getattr(response, 'status_code', None)
+    return status_code
+
+
+def _is_connection_error(exc):
+    # APITimeoutError is a subclass, so timeouts are covered too
+    return isinstance(exc, openai.APIConnectionError)
+
+
+def _get_retry_after(exc):
+    """
+    Read the server-requested delay (in seconds) from an exception's response headers.
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RateLimitScheduler:
+    """
+    A thread-safe scheduler that throttles LLM calls and retries rate-limited requests.
+
+    Every call must acquire one unit from the requests-per-minute bucket and its estimated
+    token count from the tokens-per-minute bucket. Waiting callers are served in priority
+    order (lower values first, FIFO within the same priority). Calls failing with a
+    retryable status code are retried with jittered exponential backoff, honoring the
+    server's Retry-After header, and the backoff pauses every caller sharing the scheduler.
+    Connection errors and timeouts are retried with the same backoff for the failed call only.
+
+    Args:
+        requests_per_minute (int): The maximum number of requests per minute. Defaults to 500.
+        tokens_per_minute (int): The maximum number of tokens per minute. Defaults to 200000.
+        max_retries (int): The maximum number of retries for a single call. Defaults to 5.
+        base_delay (float): The initial backoff delay in seconds. Defaults to 1.0.
+        max_delay (float): The maximum backoff delay in seconds. Defaults to 60.0.
+        token_estimator (callable): A function estimating tokens for a list of messages.
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200000, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, token_estimator=estimate_message_tokens):
+        """
+        Initialize the RateLimitScheduler with the given limits and retry policy.
+
+        Args:
+            requests_per_minute (int): The maximum number of requests per minute. Defaults to 500.
+            tokens_per_minute (int): The maximum number of tokens per minute. Defaults to 200000.
+            max_retries (int): The maximum number of retries for a single call. Defaults to 5.
+            base_delay (float): The initial backoff delay in seconds. Defaults to 1.0.
+            max_delay (float): The maximum backoff delay in seconds. Defaults to 60.0.
+            token_estimator (callable): A function estimating tokens for a list of messages.
+        """
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.token_estimator = token_estimator
+        self._condition = threading.Condition()
+        self._queue = []
+        self._counter = itertools.count()
+        self._blocked_until = 0.0
+
+    def _acquire(self, priority, tokens):
+        with self._condition:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if self._queue[0] != ticket:
+                        self._condition.wait()
+                        continue
+                    wait = max(
+                        self._blocked_until - time.monotonic(),
+                        self.request_bucket.time_until_available(1),
+                        self.token_bucket.time_until_available(tokens),
+                    )
+                    if wait <= 0:
+                        self.request_bucket.consume(1)
+                        self.token_bucket.consume(tokens)
+                        return
+                    self._condition.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+    def _backoff(self, attempt, retry_after, shared=True):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if not shared:
+            time.sleep(delay)
+            return delay
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._condition.notify_all()
+        return delay
+
+    def submit(self, func, priority=0, tokens=0):
+        """
+        Run a callable once the rate limits allow it, retrying on retryable errors.
+
+        Args:
+            func (callable): A zero-argument callable performing the request.
+            priority (int): The scheduling priority; lower values run first. Defaults to 0.
+            tokens (int): The estimated number of tokens the request will use. Defaults to 0.
+
+        Returns:
+            The value returned by func.
+
+        Raises:
+            Exception: The last error raised by func if it is not retryable or retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            try:
+                return func()
+            except Exception as exc:
+                connection_error = _is_connection_error(exc)
+                retryable = connection_error or _get_status_code(exc) in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                # A dropped connection only affects this call, so it does not pause other callers
+                self._backoff(attempt, _get_retry_after(exc), shared=not connection_error)
+                attempt += 1
+
+    def chat_completion(self, create, priority=0, **kwargs):
+        """
+        Schedule a chat completion call, estimating its tokens from the messages.
+
+        Args:
+            create (callable): The client method to call (e.g. client.chat.completions.create).
+            priority (int): The scheduling priority; lower values run first. Defaults to 0.
+            **kwargs: Keyword arguments forwarded to create.
+
+        Returns:
+            The response returned by create.
+        """
+        tokens = self.token_estimator(kwargs.get('messages', []))
+        tokens += kwargs.get('max_tokens') or 0
+        return self.submit(functools.partial(create, **kwargs), priority=priority, tokens=tokens)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Get the process-wide RateLimitScheduler, creating it on first use.
+
+    Returns:
+        RateLimitScheduler: The shared scheduler instance.
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RateLimitScheduler()
+        return _default_scheduler
+
+
+def set_scheduler(scheduler):
+    """
+    Replace the process-wide RateLimitScheduler.
+
+    Args:
+        scheduler (RateLimitScheduler): The scheduler to share across all LLM calls.
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = scheduler
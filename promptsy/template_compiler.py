@@ -0,0 +1,223 @@
+import os
+import re
+import threading
+
+
+INCLUDE_PATTERN = re.compile(r"\{%\s*include\s+['\"]?([\w.\-]+)['\"]?\s*%\}")
+
+
+class TemplateCycleError(ValueError):
+    """
+    Raised when prompt templates include each other in a cycle.
+    """
+
+
+class TemplateCompiler:
+    """
+    Resolves include references between prompt templates and caches the flattened result.
+
+    Templates reference other prompts with ``{% include name %}``. Each stored template is
+    compiled once into a flattened template and cached; a reverse dependency graph records
+    which templates include which, so invalidating a shared fragment only drops the
+    compiled templates that depend on it. When a stamp function is given, each cached entry
+    also remembers the stamp (e.g. mtime and size) of every file it was built from, so edits
+    made outside this process are picked up on the next compile.
+
+    Compilers are shared per base directory (see ``for_directory``) so every PromptManager
+    pointing at the same store sees the same cache.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Initialize an empty TemplateCompiler.
+        """
+        self._lock = threading.RLock()
+        self._compiled = {}
+        self._dependencies = {}
+        self._dependents = {}
+        self._stamps = {}
+
+    @classmethod
+    def for_directory(cls, base_directory):
+        """
+        Get the compiler shared by all prompt stores rooted at the given directory.
+
+        Args:
+            base_directory (str): The base directory of the prompt store.
+
+        Returns:
+            TemplateCompiler: The shared compiler instance.
+        """
+        key = os.path.abspath(base_directory)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls()
+            return cls._instances[key]
+
+    @staticmethod
+    def has_includes(template):
+        """
+        Check whether a template contains include references.
+
+        Args:
+            template (str): The template to check.
+
+        Returns:
+            bool: True if the template includes other prompts.
+        """
+        return '{%' in template and INCLUDE_PATTERN.search(template) is not None
+
+    def compile(self, template, resolve_key, read_template, key=None, stamp=None, stamps=None):
+        """
+        Flatten a template by recursively replacing its include references.
+
+        Args:
+            template (str): The template to compile.
+            resolve_key (callable): A function mapping an include name to the key that uniquely
+                identifies the stored prompt (e.g. its file path).
+            read_template (callable): A function returning the raw template stored under a key.
+            key (str): The key of the template being compiled, if it is stored. Used to detect
+                templates that include themselves.
+            stamp (callable): Optional function returning a value that changes whenever the
+                prompt stored under a key changes. Cached entries with a different stamp are
+                recompiled.
+            stamps (dict): Optional dictionary filled with the stamp of every stored prompt
+                the template includes, directly or indirectly, so callers can cache the result
+                and check it against the current stamps.
+
+        Returns:
+            str: The compiled template with every include resolved.
+
+        Raises:
+            TemplateCycleError: If the includes form a cycle.
+        """
+        with self._lock:
+            stack = [key] if key is not None else []
+            included = set()
+            compiled = self._expand(template, resolve_key, read_template, stack, stamp, included=included)
+            if stamps is not None:
+                for dependency in set(included):
+                    included |= self._transitive(self._dependencies, dependency)
+                stamps.update((dependency, self._stamps.get(dependency)) for dependency in included)
+            return compiled
+
+    def compile_stored(self, key, resolve_key, read_template, stamp=None):
+        """
+        Compile a stored prompt, reusing the cached result when it is still valid.
+
+        Args:
+            key (str): The key of the stored prompt.
+            resolve_key (callable): A function mapping an include name to a stored prompt key.
+            read_template (callable): A function returning the raw template stored under a key.
+            stamp (callable): Optional function returning a value that changes whenever the
+                prompt stored under a key changes.
+
+        Returns:
+            str: The compiled template.
+
+        Raises:
+            TemplateCycleError: If the includes form a cycle.
+        """
+        with self._lock:
+            return self._compile_key(key, resolve_key, read_template, [], stamp)
+
+    def _compile_key(self, key, resolve_key, read_template, stack, stamp):
+        if key in stack:
+            self._raise_cycle(stack, key)
+        if key in self._compiled and stamp is not None:
+            # Drop entries built from files that changed outside PromptManager.save
+            for source in self._transitive(self._dependencies, key) | {key}:
+                if stamp(source) != self._stamps.get(source):
+                    self.invalidate(source)
+        if key in self._compiled:
+            for dependency in self._transitive(self._dependencies, key):
+                if dependency in stack:
+                    self._raise_cycle(stack, dependency)
+            return self._compiled[key]
+
+        stack.append(key)
+        try:
+            if stamp is not None:
+                # Stamp before reading so a concurrent write is seen as a change next time
+                self._stamps[key] = stamp(key)
+            compiled = self._expand(read_template(key), resolve_key, read_template, stack, stamp, key)
+        finally:
+            stack.pop()
+        self._compiled[key] = compiled
+        return compiled
+
+    def _expand(self, template, resolve_key, read_template, stack, stamp, key=None, included=None):
+        if not self.has_includes(template):
+            return template
+
+        def replace(match):
+            dependency_key = resolve_key(match.group(1))
+            if included is not None:
+                included.add(dependency_key)
+            if key is not None:
+                self._dependencies.setdefault(key, set()).add(dependency_key)
+                self._dependents.setdefault(dependency_key, set()).add(key)
+            return self._compile_key(dependency_key, resolve_key, read_template, stack, stamp)
+
+        return INCLUDE_PATTERN.sub(replace, template)
+
+    @staticmethod
+    def _raise_cycle(stack, key):
+        cycle = stack[stack.index(key):] + [key]
+        raise TemplateCycleError("Include cycle detected: " + " -> ".join(cycle))
+
+    @staticmethod
+    def _transitive(edges, key):
+        result = set()
+        pending = list(edges.get(key, ()))
+        while pending:
+            current = pending.pop()
+            if current not in result:
+                result.add(current)
+                pending.extend(edges.get(current, ()))
+        return result
+
+    def invalidate(self, key):
+        """
+        Drop the compiled template for a key and for every template that depends on it.
+
+        Args:
+            key (str): The key of the stored prompt that changed.
+        """
+        with self._lock:
+            for current in self._transitive(self._dependents, key) | {key}:
+                self._compiled.pop(current, None)
+            self._stamps.pop(key, None)
+
+            # The changed template may include different prompts now, so forget its edges
+            for dependency in self._dependencies.pop(key, ()):
+                self._dependents.get(dependency, set()).discard(key)
+
+    def dependents(self, key):
+        """
+        Get the keys of every template that directly or indirectly includes the given key.
+
+        Args:
+            key (str): The key of a stored prompt.
+
+        Returns:
+            set: The keys of the dependent templates.
+        """
+        with self._lock:
+            return self._transitive(self._dependents, key)
+
+    def is_compiled(self, key):
+        """
+        Check whether a compiled template is cached for the given key.
+
+        Args:
+            key (str): The key of a stored prompt.
+
+        Returns:
+            bool: True if the compiled template is cached.
+        """
+        with self._lock:
+            return key in self._compiled
@@ -0,0 +1,94 @@
+import functools
+import threading
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a piece of text without calling a tokenizer.
+
+    Uses the common approximation of roughly four characters per token for English text.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated token count (at least 1 for non-empty text).
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+_tokenizer = estimate_tokens
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    Get the tokenizer used by default to count tokens.
+
+    Returns:
+        callable: A function taking a string and returning its token count.
+    """
+    return _tokenizer
+
+
+def set_tokenizer(tokenizer):
+    """
+    Replace the default tokenizer, e.g. with an exact model tokenizer.
+
+    Args:
+        tokenizer (callable): A function taking a string and returning its token count.
+            Pass None to restore the local approximation.
+    """
+    global _tokenizer
+    with _tokenizer_lock:
+        _tokenizer = tokenizer if tokenizer is not None else estimate_tokens
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_count(tokenizer, text):
+    return tokenizer(text)
+
+
+def count_tokens(text, tokenizer=None):
+    """
+    Count the tokens in a piece of text, caching the result per tokenizer and text.
+
+    Args:
+        text (str): The text to count.
+        tokenizer (callable): The tokenizer to use. Defaults to the current default tokenizer.
+
+    Returns:
+        int: The token count.
+    """
+    return _cached_count(tokenizer or get_tokenizer(), text)
+
+
+def truncate_to_tokens(text, max_tokens, tokenizer=None):
+    """
+    Truncate text to the longest prefix that fits within a token budget.
+
+    Args:
+        text (str): The text to truncate.
+        max_tokens (int): The maximum number of tokens to keep.
+        tokenizer (callable): The tokenizer to use. Defaults to the current default tokenizer.
+
+    Returns:
+        str: The truncated text.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    if max_tokens <= 0:
+        return ''
+    if tokenizer(text) <= max_tokens:
+        return text
+
+    # Binary search over the prefix length so only the truncated value is re-tokenized
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if tokenizer(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
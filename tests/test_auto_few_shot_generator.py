@@ -0,0 +1,58 @@
+import pytest
+from promptsy.auto_few_shot_generator import Example, FewShotPromptGenerator
+from promptsy.prompt import Prompt
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator = FewShotPromptGenerator(api_key='test-key')
+    generator.calls = 0
+
+    def generate_example(prompt_initial, expected_outputs=None):
+        generator.calls += 1
+        return Example(question=f"Question {generator.calls} " + "q" * 40, answer="positive")
+
+    monkeypatch.setattr(generator, 'generate_example', generate_example)
+    monkeypatch.setattr(generator, '_FewShotPromptGenerator__call_llm_reformat_prompt', lambda prompt: prompt)
+    monkeypatch.setattr(generator, 'save_few_shot_prompt', lambda prompt: None)
+    return generator
+
+
+def make_prompt():
+    return Prompt(name="sentiment", description="A test prompt", template="Classify: {text}")
+
+
+def test_generate_examples_stores_examples_on_prompt(generator):
+    prompt, examples = generator.generate_examples(make_prompt(), num_examples=3, return_examples=True)
+
+    assert '{examples}' in prompt.template
+    assert len(prompt.examples) == 3
+    assert [example['question'] for example in prompt.examples] == [example.question for example in examples]
+    assert "## Example 3\nQuestion 3" in prompt.format(text="Great!")
+
+
+def test_generate_examples_respects_budget(generator):
+    prompt = generator.generate_examples(make_prompt(), num_examples=5, max_tokens=60)
+
+    assert 0 < len(prompt.examples) < 5
+    assert prompt.token_count(text="") <= 60
+    # Generation stops at the first example that does not fit
+    assert generator.calls == len(prompt.examples) + 1
+
+
+def test_generate_examples_budgets_reformatted_template(generator, monkeypatch):
+    monkeypatch.setattr(
+        generator, '_FewShotPromptGenerator__call_llm_reformat_prompt',
+        lambda prompt: "Detailed instructions. " * 5 + prompt
+    )
+    prompt = generator.generate_examples(make_prompt(), num_examples=5, max_tokens=80)
+
+    assert prompt.token_count(text="") <= 80
+
+
+def test_generate_examples_restores_missing_placeholder(generator, monkeypatch):
+    monkeypatch.setattr(generator, '_FewShotPromptGenerator__call_llm_reformat_prompt', lambda prompt: "Classify: {text}")
+    prompt = generator.generate_examples(make_prompt(), num_examples=1)
+
+    assert "## Example 1" in prompt.format(text="Great!")
@@ -68,3 +68,87 @@ def test_prompt_save_and_load():
     assert loaded_prompt.name == prompt.name
     assert loaded_prompt.description == prompt.description
     assert loaded_prompt.template == prompt.template
+
+def make_few_shot_prompt():
+    return Prompt(
+        name="few_shot_prompt",
+        description="A test prompt",
+        template="Classify the text.\n{examples}Text: {text}\nLabel:",
+        examples=[
+            {'question': 'I love it', 'answer': 'positive'},
+            {'question': 'I hate it', 'answer': 'negative'},
+            {'question': 'It is fine', 'answer': 'neutral'},
+        ]
+    )
+
+def test_prompt_format_renders_examples():
+    prompt = make_few_shot_prompt()
+    formatted_prompt = prompt.format(text="Great!")
+    assert formatted_prompt.startswith("Classify the text.\n## Example 1\nI love it\npositive\n\n")
+    assert "## Example 3\nIt is fine\nneutral\n\n" in formatted_prompt
+    assert formatted_prompt.endswith("Text: Great!\nLabel:")
+
+def test_prompt_format_with_budget_matches_format():
+    prompt = make_few_shot_prompt()
+    assert prompt.format_with_budget(1000, text="Great!") == prompt.format(text="Great!")
+
+def test_prompt_format_trims_examples_to_budget():
+    prompt = make_few_shot_prompt()
+    budget = prompt.token_count(text="Great!") - 1
+    formatted_prompt = prompt.format_with_budget(budget, text="Great!")
+    assert "## Example 2" in formatted_prompt
+    assert "## Example 3" not in formatted_prompt
+    assert formatted_prompt.endswith("Text: Great!\nLabel:")
+
+def test_prompt_format_truncates_designated_variables():
+    prompt = Prompt(name="summary", description="A test prompt", template="Summarize: {document}")
+    formatted_prompt = prompt.format_with_budget(10, truncate=["document"], document="a" * 400)
+    assert formatted_prompt.startswith("Summarize: aaaa")
+    assert prompt.token_count(document=formatted_prompt[len("Summarize: "):]) <= 10
+
+def test_prompt_format_raises_when_budget_cannot_be_met():
+    prompt = Prompt(name="summary", description="A test prompt", template="Summarize: {document}")
+    with pytest.raises(ValueError):
+        prompt.format_with_budget(10, document="a" * 400)
+
+def test_prompt_template_tokens_are_cached():
+    calls = []
+
+    def tokenizer(text):
+        calls.append(text)
+        return len(text.split())
+
+    prompt = Prompt(name="greeting", description="A test prompt", template="Hello there, {name}!", tokenizer=tokenizer)
+    assert prompt.template_token_count() == 3
+    prompt.format_with_budget(100, name="John")
+    prompt.format_with_budget(100, name="Jane")
+    assert calls.count("Hello there, ") == 1
+
+def test_prompt_to_dict_includes_examples():
+    prompt = make_few_shot_prompt()
+    loaded_prompt = Prompt.from_dict(prompt.to_dict())
+    assert loaded_prompt.examples == prompt.examples
+
+def test_prompt_format_accepts_any_variable_name():
+    prompt = Prompt(name="limits", description="A test prompt", template="Answer in at most {max_tokens} words: {q} {truncate}")
+    assert prompt.format(max_tokens=50, q="hi", truncate="!") == "Answer in at most 50 words: hi !"
+    assert prompt.format_with_budget(100, values={'max_tokens': 50, 'truncate': '!'}, q="hi") == "Answer in at most 50 words: hi !"
+
+def test_prompt_format_with_budget_matches_str_format():
+    prompt = Prompt(
+        name="layout",
+        description="A test prompt",
+        template="{{literal}} [{a:>{w}}] {b!r:{fill}^{w}} {c[0]} {{{a}}}"
+    )
+    kwargs = {'a': 'z', 'b': 'y', 'c': ['first'], 'w': 5, 'fill': '*'}
+    assert prompt.format_with_budget(100, **kwargs) == prompt.format(**kwargs)
+    assert prompt.format(**kwargs) == "{literal} [    z] *'y'* first {z}"
+
+def test_prompt_trim_examples():
+    prompt = make_few_shot_prompt()
+    budget = prompt.token_count(text="") - prompt._example_token_counts()[-1]
+    prompt.trim_examples(budget)
+    assert len(prompt.examples) == 2
+
+    with pytest.raises(ValueError):
+        prompt.trim_examples(1)
@@ -44,3 +44,132 @@ def test_list_prompts(prompt_manager):
     assert 'examples.hello_world' in prompts
     assert 'examples.goodbye' in prompts
     assert 'custom.custom_prompt' in prompts
+
+@pytest.fixture
+def versioned_manager(tmp_path):
+    return PromptManager(base_directory=str(tmp_path / 'prompts'))
+
+def make_prompt(template):
+    return {'name': 'greeting', 'description': 'A test prompt', 'template': template}
+
+def test_save_skips_unchanged_prompt(versioned_manager):
+    first_digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    file_path = versioned_manager._get_file_path('examples.greeting')
+    os.utime(file_path, (0, 0))
+
+    second_digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    assert second_digest == first_digest
+    assert os.path.getmtime(file_path) == 0
+    assert versioned_manager.list_versions('examples.greeting') == [first_digest]
+
+def test_save_keeps_version_history(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    assert len(versioned_manager.list_versions('examples.greeting')) == 2
+    assert versioned_manager.load('examples.greeting').template == 'Hi, {name}!'
+    assert versioned_manager.load('examples.greeting', version=1).template == 'Hello, {name}!'
+    assert versioned_manager.load('examples.greeting', version=2).template == 'Hi, {name}!'
+    assert versioned_manager.load('examples.greeting', version=-2).template == 'Hello, {name}!'
+
+def test_load_version_by_digest(versioned_manager):
+    digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    assert versioned_manager.load('examples.greeting', version=digest).template == 'Hello, {name}!'
+
+def test_load_rejects_digest_of_another_prompt(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.first')
+    other_digest = versioned_manager.save(make_prompt('Bye, {name}!'), 'examples.second')
+
+    with pytest.raises(FileNotFoundError, match='examples.first'):
+        versioned_manager.load('examples.first', version=other_digest)
+
+def test_load_version_from_numeric_string(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    assert versioned_manager.load('examples.greeting', version='1').template == 'Hello, {name}!'
+    with pytest.raises(FileNotFoundError, match='examples.greeting'):
+        versioned_manager.load('examples.greeting', version='../../custom/x')
+
+def test_version_log_entries_are_fixed_width(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    log_path = versioned_manager._get_version_log_path(versioned_manager._get_file_path('examples.greeting'))
+    assert os.path.getsize(log_path) == 2 * 65
+
+def test_partial_version_log_entry_is_dropped(versioned_manager):
+    first_digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    log_path = versioned_manager._get_version_log_path(versioned_manager._get_file_path('examples.greeting'))
+    # Simulate a write interrupted halfway through an entry
+    with open(log_path, 'ab') as file:
+        file.write(b'0123abcd')
+
+    assert versioned_manager.list_versions('examples.greeting') == [first_digest]
+    second_digest = versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    assert versioned_manager.list_versions('examples.greeting') == [first_digest, second_digest]
+    assert versioned_manager.load('examples.greeting', version=-1).template == 'Hi, {name}!'
+    assert os.path.getsize(log_path) == 2 * 65
+
+def test_corrupt_version_log_entry_raises(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    log_path = versioned_manager._get_version_log_path(versioned_manager._get_file_path('examples.greeting'))
+    with open(log_path, 'ab') as file:
+        file.write(b'x' * 64 + b'\n')
+
+    with pytest.raises(ValueError):
+        versioned_manager.load('examples.greeting', version=2)
+    with pytest.raises(ValueError):
+        versioned_manager.list_versions('examples.greeting')
+
+def test_concurrent_saves_of_same_content(versioned_manager):
+    import threading
+    errors = []
+
+    def save(index):
+        try:
+            versioned_manager.save(make_prompt('Shared, {name}!'), f'examples.prompt_{index}')
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=save, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert versioned_manager.load('examples.prompt_7', version=1).template == 'Shared, {name}!'
+
+def test_load_non_existent_version(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+
+    with pytest.raises(FileNotFoundError):
+        versioned_manager.load('examples.greeting', version=2)
+    with pytest.raises(FileNotFoundError):
+        versioned_manager.load('examples.greeting', version=0)
+
+def test_identical_prompts_share_blob(versioned_manager):
+    first_digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.first')
+    second_digest = versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.second')
+
+    assert first_digest == second_digest
+    objects_directory = os.path.join(versioned_manager.base_directory, '.versions', 'objects')
+    assert sum(len(files) for _, _, files in os.walk(objects_directory)) == 1
+
+def test_save_accepts_prompt_objects(versioned_manager):
+    from promptsy.prompt import Prompt
+    prompt = Prompt(name='greeting', description='A test prompt', template='Hello, {name}!')
+    versioned_manager.save(prompt, 'examples.greeting')
+
+    loaded_prompt = versioned_manager.load('examples.greeting')
+    assert loaded_prompt.template == 'Hello, {name}!'
+
+def test_versions_are_not_listed_as_prompts(versioned_manager):
+    versioned_manager.save(make_prompt('Hello, {name}!'), 'examples.greeting')
+    versioned_manager.save(make_prompt('Hi, {name}!'), 'examples.greeting')
+
+    assert versioned_manager.list_prompts() == ['examples.greeting']
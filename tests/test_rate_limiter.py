@@ -0,0 +1,234 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import openai
+import pytest
+from promptsy.prompt_enhancer import PromptEnhancer
+from promptsy.rate_limiter import RateLimitScheduler, TokenBucket
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers chat completion requests, injecting the configured failures and latency.
+    """
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with server.lock:
+            server.request_count += 1
+            server.prompts.append(request.get('messages', [{}])[-1].get('content'))
+            status, headers = server.failures.pop(0) if server.failures else (200, {})
+        time.sleep(server.latency)
+
+        if status is None:
+            # Drop the connection without sending a response
+            self.close_connection = True
+            return
+
+        if status == 200:
+            body = {
+                'id': 'chatcmpl-test',
+                'object': 'chat.completion',
+                'created': 0,
+                'model': 'gpt-4o-mini',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' Hello! '},
+                    'finish_reason': 'stop',
+                }],
+            }
+        else:
+            body = {'error': {'message': 'injected failure', 'type': 'requests', 'code': status}}
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.prompts = []
+    server.failures = []
+    server.latency = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def enhancer_factory(stand_in_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def factory(scheduler, priority=0):
+        enhancer = PromptEnhancer(api_key='test-key', scheduler=scheduler, priority=priority)
+        enhancer.client = enhancer.client.with_options(
+            base_url=f"http://127.0.0.1:{stand_in_server.server_port}/v1"
+        )
+        return enhancer
+
+    return factory
+
+
+def test_token_bucket_refills_over_time():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])
+    bucket.consume(60)
+    assert bucket.time_until_available(1) == pytest.approx(1.0)
+
+    now[0] = 0.5
+    assert bucket.time_until_available(1) == pytest.approx(0.5)
+
+    now[0] = 120.0
+    assert bucket.time_until_available(60) == 0.0
+    assert bucket.available == 60
+
+
+def test_call_llm_retries_after_429(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(429, {'Retry-After': '0.2'}), (429, {'retry-after-ms': '100'})]
+    enhancer = enhancer_factory(RateLimitScheduler(base_delay=0.01))
+
+    start = time.monotonic()
+    assert enhancer._call_llm("Say hello") == "Hello!"
+    assert time.monotonic() - start >= 0.3
+    assert stand_in_server.request_count == 3
+
+
+def test_call_llm_raises_when_retries_exhausted(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(429, {'Retry-After': '0'})] * 3
+    enhancer = enhancer_factory(RateLimitScheduler(max_retries=2, base_delay=0.01))
+
+    with pytest.raises(openai.RateLimitError):
+        enhancer._call_llm("Say hello")
+    assert stand_in_server.request_count == 3
+
+
+def test_call_llm_does_not_retry_client_errors(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(400, {})]
+    enhancer = enhancer_factory(RateLimitScheduler(base_delay=0.01))
+
+    with pytest.raises(openai.BadRequestError):
+        enhancer._call_llm("Say hello")
+    assert stand_in_server.request_count == 1
+
+
+def test_call_llm_retries_dropped_connections(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(None, {}), (None, {})]
+    enhancer = enhancer_factory(RateLimitScheduler(base_delay=0.01))
+
+    assert enhancer._call_llm("Say hello") == "Hello!"
+    assert stand_in_server.request_count == 3
+
+
+def test_call_llm_retries_request_timeouts(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(408, {}), (409, {})]
+    enhancer = enhancer_factory(RateLimitScheduler(base_delay=0.01))
+
+    assert enhancer._call_llm("Say hello") == "Hello!"
+    assert stand_in_server.request_count == 3
+
+
+def test_call_llm_raises_connection_error_when_retries_exhausted(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(None, {})] * 2
+    enhancer = enhancer_factory(RateLimitScheduler(max_retries=1, base_delay=0.01))
+
+    with pytest.raises(openai.APIConnectionError):
+        enhancer._call_llm("Say hello")
+    assert stand_in_server.request_count == 2
+
+
+def test_concurrent_calls_share_backoff(stand_in_server, enhancer_factory):
+    stand_in_server.failures = [(429, {'Retry-After': '0.2'})]
+    stand_in_server.latency = 0.05
+    enhancer = enhancer_factory(RateLimitScheduler(base_delay=0.01))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(enhancer._call_llm("Say hello"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert results == ["Hello!"] * 4
+    assert stand_in_server.request_count == 5
+
+
+def test_requests_per_minute_limit_throttles_calls():
+    scheduler = RateLimitScheduler(requests_per_minute=600)
+    scheduler.request_bucket.available = 0
+
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.submit(lambda: None)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_tokens_per_minute_limit_throttles_calls():
+    scheduler = RateLimitScheduler(tokens_per_minute=6000)
+    scheduler.submit(lambda: None, tokens=6000)
+
+    start = time.monotonic()
+    scheduler.submit(lambda: None, tokens=20)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_waiting_calls_run_in_priority_order():
+    scheduler = RateLimitScheduler()
+    scheduler._blocked_until = time.monotonic() + 0.2
+    order = []
+
+    def worker(priority):
+        scheduler.submit(lambda: order.append(priority), priority=priority)
+
+    threads = []
+    for priority in (5, 1, 3):
+        thread = threading.Thread(target=worker, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        while len(scheduler._queue) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == [1, 3, 5]
+
+
+def test_enhancer_priority_orders_waiting_calls(stand_in_server, enhancer_factory):
+    scheduler = RateLimitScheduler()
+    # Space requests out so each one reaches the server before the next is released
+    scheduler.request_bucket = TokenBucket(300, capacity=1)
+    background = enhancer_factory(scheduler, priority=5)
+    interactive = enhancer_factory(scheduler, priority=1)
+    scheduler._blocked_until = time.monotonic() + 0.2
+
+    threads = []
+    for enhancer, prompt in ((background, "background"), (interactive, "interactive")):
+        thread = threading.Thread(target=enhancer._call_llm, args=(prompt,))
+        thread.start()
+        threads.append(thread)
+        while len(scheduler._queue) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert stand_in_server.prompts == ["interactive", "background"]
@@ -0,0 +1,151 @@
+import os
+import yaml
+import pytest
+from promptsy.prompt import Prompt
+from promptsy.prompt_manager import PromptManager
+from promptsy.template_compiler import TemplateCycleError
+
+
+@pytest.fixture
+def prompt_manager(tmp_path):
+    return PromptManager(base_directory=str(tmp_path / 'prompts'))
+
+
+def save_prompt(manager, name, template):
+    manager.save({'name': name, 'description': 'A test prompt', 'template': template}, name)
+
+
+def test_compile_resolves_nested_includes(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'fragments.rules', 'Rules:\n{% include fragments.safety %}')
+    save_prompt(prompt_manager, 'examples.greeting', '{% include fragments.rules %}\nHello, {name}!')
+
+    assert prompt_manager.compile('examples.greeting') == 'Rules:\nBe safe.\nHello, {name}!'
+
+
+def test_prompt_format_resolves_includes(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.output', 'Answer in JSON.')
+    prompt = Prompt(
+        name='greeting', description='A test prompt',
+        template='Hello, {name}! {% include "fragments.output" %}', prompt_manager=prompt_manager
+    )
+
+    assert prompt.format(name='John') == 'Hello, John! Answer in JSON.'
+
+
+def test_loaded_prompt_resolves_includes_from_its_manager(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.output', 'Answer in JSON.')
+    save_prompt(prompt_manager, 'examples.greeting', 'Hello, {name}! {% include fragments.output %}')
+
+    assert prompt_manager.load('examples.greeting').format(name='John') == 'Hello, John! Answer in JSON.'
+    assert prompt_manager.load('examples.greeting', version=1).format(name='John') == 'Hello, John! Answer in JSON.'
+
+
+def test_prompt_caches_compiled_template(prompt_manager, monkeypatch):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'fragments.rules', '{% include fragments.safety %} Be kind.')
+    prompt = Prompt(
+        name='greeting', description='A test prompt',
+        template='{% include fragments.rules %} Hi {name}', prompt_manager=prompt_manager
+    )
+    compile_template = prompt_manager.compile_template
+    calls = []
+
+    def counting_compile_template(*args, **kwargs):
+        calls.append(args)
+        return compile_template(*args, **kwargs)
+
+    monkeypatch.setattr(prompt_manager, 'compile_template', counting_compile_template)
+    assert prompt.format(name='John') == 'Be safe. Be kind. Hi John'
+    assert prompt.token_count(name='John') > 0
+    assert prompt.format(name='Jane') == 'Be safe. Be kind. Hi Jane'
+    assert len(calls) == 1
+
+    # Editing an indirect include or the template itself expands the template again
+    save_prompt(prompt_manager, 'fragments.safety', 'Be very safe.')
+    assert prompt.format(name='John') == 'Be very safe. Be kind. Hi John'
+    prompt.template = '{% include fragments.safety %} Bye {name}'
+    assert prompt.format(name='John') == 'Be very safe. Bye John'
+    assert len(calls) == 3
+
+
+def test_compiled_templates_are_cached(prompt_manager, monkeypatch):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'examples.greeting', '{% include fragments.safety %} Hi')
+    prompt_manager.compile('examples.greeting')
+
+    def fail(file_path):
+        raise AssertionError(f"{file_path} was read again")
+
+    monkeypatch.setattr(prompt_manager, '_read_template', fail)
+    assert prompt_manager.compile('examples.greeting') == 'Be safe. Hi'
+
+
+def test_saving_fragment_invalidates_only_dependents(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'fragments.format', 'Use JSON.')
+    save_prompt(prompt_manager, 'examples.first', '{% include fragments.safety %} One')
+    save_prompt(prompt_manager, 'examples.second', '{% include fragments.format %} Two')
+    prompt_manager.compile('examples.first')
+    prompt_manager.compile('examples.second')
+
+    save_prompt(prompt_manager, 'fragments.safety', 'Be very safe.')
+
+    compiler = prompt_manager.template_compiler
+    assert not compiler.is_compiled(prompt_manager._get_file_path('examples.first'))
+    assert compiler.is_compiled(prompt_manager._get_file_path('examples.second'))
+    assert prompt_manager.compile('examples.first') == 'Be very safe. One'
+
+
+def test_managers_on_same_directory_share_cache(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'examples.greeting', '{% include fragments.safety %} Hi')
+    prompt_manager.compile('examples.greeting')
+
+    other_manager = PromptManager(base_directory=prompt_manager.base_directory)
+    save_prompt(other_manager, 'fragments.safety', 'Be careful.')
+
+    assert prompt_manager.compile('examples.greeting') == 'Be careful. Hi'
+
+
+def test_fragment_edited_outside_manager_is_picked_up(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.safety', 'Be safe.')
+    save_prompt(prompt_manager, 'examples.greeting', '{% include fragments.safety %} Hi')
+    assert prompt_manager.compile('examples.greeting') == 'Be safe. Hi'
+
+    # Rewrite the fragment directly, as a hand edit or another process would
+    file_path = prompt_manager._get_file_path('fragments.safety')
+    with open(file_path, 'w') as file:
+        yaml.dump({'text': {'name': 'safety', 'description': 'A test prompt', 'template': 'Be careful.'}}, file)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    assert prompt_manager.compile('examples.greeting') == 'Be careful. Hi'
+
+
+def test_include_cycle_is_detected(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.a', '{% include fragments.b %}')
+    save_prompt(prompt_manager, 'fragments.b', '{% include fragments.a %}')
+
+    with pytest.raises(TemplateCycleError):
+        prompt_manager.compile('fragments.a')
+
+
+def test_cycle_through_cached_fragment_is_detected(prompt_manager):
+    save_prompt(prompt_manager, 'fragments.a', 'A')
+    save_prompt(prompt_manager, 'fragments.b', '{% include fragments.a %}')
+    prompt_manager.compile('fragments.b')
+
+    prompt = Prompt(
+        name='fragments.a', description='A test prompt', template='{% include fragments.b %}',
+        prompt_manager=prompt_manager
+    )
+    with pytest.raises(TemplateCycleError):
+        prompt.format()
+
+
+def test_missing_include_raises(prompt_manager):
+    save_prompt(prompt_manager, 'examples.greeting', '{% include fragments.missing %}')
+
+    with pytest.raises(FileNotFoundError):
+        prompt_manager.compile('examples.greeting')
@@ -0,0 +1,42 @@
+import pytest
+from promptsy.tokenizer import count_tokens, estimate_tokens, get_tokenizer, set_tokenizer, truncate_to_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abc') == 1
+    assert estimate_tokens('a' * 40) == 10
+
+
+def test_count_tokens_uses_given_tokenizer():
+    assert count_tokens('one two three', tokenizer=lambda text: len(text.split())) == 3
+
+
+def test_count_tokens_caches_per_text():
+    calls = []
+
+    def tokenizer(text):
+        calls.append(text)
+        return len(text)
+
+    assert count_tokens('cached text', tokenizer) == 11
+    assert count_tokens('cached text', tokenizer) == 11
+    assert calls == ['cached text']
+
+
+def test_set_tokenizer_replaces_default():
+    word_tokenizer = lambda text: len(text.split())
+    set_tokenizer(word_tokenizer)
+    try:
+        assert get_tokenizer() is word_tokenizer
+        assert count_tokens('one two three') == 3
+    finally:
+        set_tokenizer(None)
+    assert get_tokenizer() is estimate_tokens
+
+
+def test_truncate_to_tokens():
+    text = 'a' * 100
+    assert truncate_to_tokens(text, 10) == 'a' * 40
+    assert truncate_to_tokens(text, 100) == text
+    assert truncate_to_tokens(text, 0) == ''